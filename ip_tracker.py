@@ -1,74 +1,174 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import subprocess
-import venv
+import shutil
+import importlib.machinery
 from pathlib import Path
 import logging
 import json
+import hashlib
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt, Confirm
 from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
-import tkinter as tk
-from tkinter import filedialog
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-console = Console()
+# Every message uses explicit markup, so rich's automatic highlighting is not needed
+console = Console(highlight=False)
+
+# Absolute path of this script, used to re-run it inside the virtual environment
+SCRIPT_PATH = os.path.abspath(__file__)
+# major.minor of the running interpreter, which the venv is created from and must match
+PYTHON_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}"
+# Python executable inside the virtual environment
+VENV_PYTHON = "venv\\Scripts\\python.exe" if sys.platform == "win32" else "venv/bin/python"
+# Working directory the output files are written to; it never changes during a run
+CWD = os.getcwd()
+
+# Pinned packages installed into the virtual environment
+REQUIRED_PACKAGES = [
+    "requests==2.31.0",
+    "beautifulsoup4==4.12.2",
+    "rich==13.7.0"
+]
+# Discord webhook URLs have the form .../api/webhooks/<id>/<token>
+# with an optional query string such as ?thread_id=N or ?wait=true
+WEBHOOK_URL_RE = re.compile(
+    r"https://(?:ptb\.|canary\.)?discord(?:app)?\.com/api/webhooks/[0-9]+/[A-Za-z0-9_-]+/?(?:\?[^\s#]*)?"
+)
+# Top-level modules provided by the required packages
+REQUIRED_MODULES = ["requests", "bs4", "rich"]
+# Source passed to "python -c" to check that every required module imports
+IMPORT_PROBE = "; ".join(f"import {name}" for name in REQUIRED_MODULES)
+# Written after a successful setup so later runs can skip the import probe
+DEPS_MARKER = Path("venv") / ".deps_ok"
+
+# Hidden Tk root shared by all file dialogs
+_tk_root = None
+
+def get_tk_root():
+    """Return the hidden Tk root, creating it on first use"""
+    global _tk_root
+    if _tk_root is None:
+        import tkinter as tk
+        _tk_root = tk.Tk()
+        _tk_root.withdraw()  # Hide the main window
+    return _tk_root
 
 def select_file(title="Select File", filetypes=None):
     """Open file picker dialog and return selected file path"""
-    root = tk.Tk()
-    root.withdraw()  # Hide the main window
-    file_path = filedialog.askopenfilename(title=title, filetypes=filetypes)
+    from tkinter import filedialog
+    root = get_tk_root()
+    file_path = filedialog.askopenfilename(parent=root, title=title, filetypes=filetypes)
     return file_path if file_path else None
 
 def select_save_file(title="Save File As", filetypes=None):
     """Open save file dialog and return selected file path"""
-    root = tk.Tk()
-    root.withdraw()  # Hide the main window
-    file_path = filedialog.asksaveasfilename(title=title, filetypes=filetypes)
+    from tkinter import filedialog
+    root = get_tk_root()
+    file_path = filedialog.asksaveasfilename(parent=root, title=title, filetypes=filetypes)
     return file_path if file_path else None
 
-def get_venv_python():
-    """Get the Python executable path from virtual environment."""
+def get_venv_site_packages():
+    """Get the site-packages directory of the virtual environment, if any."""
     if sys.platform == "win32":
-        return "venv\\Scripts\\python.exe"
-    return "venv/bin/python"
+        site_packages = Path("venv") / "Lib" / "site-packages"
+    else:
+        # Use the directory for the venv's own version, not a stale one left by an older Python
+        version = get_venv_version()
+        if version is None:
+            return None
+        site_packages = Path("venv") / "lib" / f"python{version}" / "site-packages"
+    return site_packages if site_packages.is_dir() else None
+
+def get_venv_version():
+    """Get the major.minor Python version recorded in the venv's pyvenv.cfg, if any."""
+    try:
+        lines = (Path("venv") / "pyvenv.cfg").read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        key, _, value = line.partition("=")
+        if key.strip() in ("version", "version_info"):
+            return ".".join(value.strip().split(".")[:2])
+    return None
 
 def check_venv():
     """Check if virtual environment exists and is valid."""
-    venv_path = Path("venv")
-    if not venv_path.exists():
+    # The interpreter only exists inside a created venv, so one stat covers both
+    if not os.path.exists(VENV_PYTHON):
         return False
     
-    python_executable = get_venv_python()
-    if not os.path.exists(python_executable):
+    # A venv built for another interpreter version cannot import its packages
+    if get_venv_version() != PYTHON_VERSION:
         return False
     
+    # Only a marker written by setup for the current pins counts; anything else
+    # sends setup back through pip, which is quick when the pins are already met
     try:
-        # Try to import all required packages to verify the environment
-        subprocess.check_call([python_executable, "-c", "import requests; import PyPDF2; import bs4; import rich"])
-        return True
-    except subprocess.CalledProcessError:
+        if DEPS_MARKER.read_text().strip() != get_packages_hash():
+            return False
+    except OSError:
         return False
+    
+    # Make sure the packages were not removed since the marker was written
+    return venv_has_required_modules()
+
+def venv_has_required_modules():
+    """Check that every required module is present in the venv's site-packages."""
+    site_packages = get_venv_site_packages()
+    if site_packages is None:
+        return False
+    search_path = [str(site_packages)]
+    for name in REQUIRED_MODULES:
+        spec = importlib.machinery.PathFinder.find_spec(name, search_path)
+        # A bare leftover directory resolves as a namespace package with no origin
+        if spec is None or spec.origin is None:
+            return False
+    return True
+
+def get_packages_hash():
+    """Hash the pins and interpreter version so changing either invalidates the marker."""
+    key = sorted(REQUIRED_PACKAGES) + [f"python=={PYTHON_VERSION}"]
+    return hashlib.sha256("\n".join(key).encode()).hexdigest()
+
+def write_deps_marker():
+    """Record that the required packages are installed in the virtual environment."""
+    try:
+        DEPS_MARKER.write_text(get_packages_hash())
+    except OSError as e:
+        logger.error(f"Error writing dependency marker: {str(e)}")
+
+def run_captured(command, message):
+    """Run a command behind a single status line, showing its output only if it fails."""
+    with console.status(f"[yellow]{message}[/yellow]"):
+        result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        # Decode only on failure, and never let an odd byte hide the real error;
+        # pip puts resolver context on stdout and the final error on stderr
+        stdout = result.stdout.decode(errors="replace")
+        stderr = result.stderr.decode(errors="replace")
+        console.print(stdout + stderr, markup=False)
+        raise subprocess.CalledProcessError(result.returncode, command, stdout, stderr)
 
 def install_package(pip_executable, python_executable, package):
     """Install a package with error handling."""
     try:
-        console.print(f"[yellow]Installing {package}...[/yellow]")
-        subprocess.check_call([pip_executable, "install", "--no-cache-dir", package])
+        run_captured([pip_executable, "install", "--no-cache-dir", package], f"Installing {package}...")
         console.print(f"[green]Successfully installed {package}[/green]")
         return True
     except subprocess.CalledProcessError as e:
         console.print(f"[red]Error installing {package}: {str(e)}[/red]")
         # Try alternative installation method
         try:
-            console.print(f"[yellow]Trying alternative installation method for {package}...[/yellow]")
-            subprocess.check_call([python_executable, "-m", "pip", "install", "--no-cache-dir", package])
+            run_captured(
+                [python_executable, "-m", "pip", "install", "--no-cache-dir", package],
+                f"Trying alternative installation method for {package}..."
+            )
             console.print(f"[green]Successfully installed {package} using alternative method[/green]")
             return True
         except subprocess.CalledProcessError as e2:
@@ -78,52 +178,72 @@ def install_package(pip_executable, python_executable, package):
 def setup_environment():
     """Set up the virtual environment and install requirements."""
     try:
+        # Nothing to do if the environment is already set up
+        if check_venv():
+            return VENV_PYTHON
+        
         # Create new virtual environment if needed
+        import venv
         venv_path = Path("venv")
         if not venv_path.exists():
             console.print("[yellow]Creating new virtual environment...[/yellow]")
             venv.create("venv", with_pip=True)
-        
-        # Get the correct Python executable path
-        python_executable = get_venv_python()
-        pip_executable = "venv\\Scripts\\pip.exe" if sys.platform == "win32" else "venv/bin/pip"
-        
-        # Upgrade pip first
-        console.print("[yellow]Upgrading pip...[/yellow]")
-        subprocess.check_call([python_executable, "-m", "pip", "install", "--upgrade", "pip"])
+        else:
+            venv_version = get_venv_version()
+            # Without pyvenv.cfg the directory is not known to be a venv, so never clear it
+            if venv_version is None:
+                console.print("[red]The 'venv' directory exists but is not a virtual environment (no pyvenv.cfg). Move or remove it and try again.[/red]")
+                return None
+            # A venv made by another Python version has to be rebuilt, which deletes its contents
+            if venv_version != PYTHON_VERSION:
+                if not Confirm.ask(
+                    f"\n[bold blue]The virtual environment was built for Python {venv_version}, "
+                    f"but this is Python {PYTHON_VERSION}. Delete and rebuild it?[/bold blue]"
+                ):
+                    console.print("[red]Cannot continue with a virtual environment built for another Python version.[/red]")
+                    return None
+                console.print("[yellow]Rebuilding virtual environment...[/yellow]")
+                venv.create("venv", with_pip=True, clear=True)
+        
+        python_executable = VENV_PYTHON
         
         # Install required packages with specific versions
-        console.print("[yellow]Installing required packages...[/yellow]")
-        packages = [
-            "requests==2.31.0",
-            "PyPDF2==3.0.1",
-            "beautifulsoup4==4.12.2",
-            "rich==13.7.0"
-        ]
-        
-        for package in packages:
-            try:
-                console.print(f"[yellow]Installing {package}...[/yellow]")
-                subprocess.check_call([python_executable, "-m", "pip", "install", "--no-cache-dir", package])
-                console.print(f"[green]Successfully installed {package}[/green]")
-            except subprocess.CalledProcessError as e:
-                console.print(f"[red]Error installing {package}: {str(e)}[/red]")
-                return None
+        # A single pip call upgrades pip and resolves all packages together
+        try:
+            run_captured(
+                [python_executable, "-m", "pip", "install", "--no-cache-dir",
+                 "--upgrade", "--upgrade-strategy", "only-if-needed", "pip", *REQUIRED_PACKAGES],
+                "Upgrading pip and installing required packages..."
+            )
+            console.print("[green]Successfully installed required packages[/green]")
+        except subprocess.CalledProcessError as e:
+            console.print(f"[red]Error installing required packages: {str(e)}[/red]")
+            return None
         
         # Verify installations
         console.print("[yellow]Verifying package installations...[/yellow]")
-        try:
-            subprocess.check_call([python_executable, "-c", "import requests; import PyPDF2; import bs4; import rich"])
+        if venv_has_required_modules():
             console.print("[green]All packages installed successfully![/green]")
+            write_deps_marker()
             return python_executable
-        except subprocess.CalledProcessError as e:
-            console.print(f"[red]Error verifying package installations: {str(e)}[/red]")
-            return None
+        console.print("[red]Error verifying package installations: required modules not found in the virtual environment[/red]")
+        return None
             
     except Exception as e:
         console.print(f"[red]Error during setup: {str(e)}[/red]")
         return None
 
+def exec_in_venv(python_executable):
+    """Restart the script under the virtual environment's Python."""
+    # Run the script in the virtual environment
+    console.print("[green]Starting IP Tracker Tool in virtual environment...[/green]")
+    if sys.platform == "win32":
+        # os.execv on Windows spawns a detached process instead of replacing this one
+        subprocess.call([python_executable, SCRIPT_PATH, "--in-venv"])
+    else:
+        # Replace the current process so only one interpreter stays resident
+        os.execv(python_executable, [python_executable, SCRIPT_PATH, "--in-venv"])
+
 def run_in_venv():
     """Run the script in the virtual environment."""
     python_executable = setup_environment()
@@ -131,20 +251,17 @@ def run_in_venv():
         console.print("[red]Failed to set up the environment. Please check your Python installation and try again.[/red]")
         sys.exit(1)
     
-    # Get the current script path
-    script_path = os.path.abspath(__file__)
-    
-    # Run the script in the virtual environment
-    console.print("[green]Starting IP Tracker Tool in virtual environment...[/green]")
-    subprocess.call([python_executable, script_path, "--in-venv"])
+    exec_in_venv(python_executable)
+
+# Reused compact encoder for config.json
+encode_json = json.JSONEncoder(separators=(",", ":")).encode
 
 def load_config():
     """Load configuration from config.json"""
     config_path = Path("config.json")
     if config_path.exists():
         try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
+            return json.loads(config_path.read_bytes())
         except Exception as e:
             logger.error(f"Error loading config: {str(e)}")
     return {"webhook_url": None}
@@ -152,8 +269,11 @@ def load_config():
 def save_config(config):
     """Save configuration to config.json"""
     try:
-        with open("config.json", 'w') as f:
-            json.dump(config, f)
+        data = encode_json(config).encode()
+        # Write to a temporary file and rename it so a crash never leaves a partial config
+        tmp_path = "config.json.tmp"
+        Path(tmp_path).write_bytes(data)
+        os.replace(tmp_path, "config.json")
     except Exception as e:
         logger.error(f"Error saving config: {str(e)}")
 
@@ -166,18 +286,32 @@ def get_webhook_url():
     
     while True:
         webhook_url = Prompt.ask("\n[bold blue]Enter your Discord webhook URL[/bold blue]")
-        if webhook_url.startswith('https://discord.com/api/webhooks/'):
+        if WEBHOOK_URL_RE.fullmatch(webhook_url):
             config["webhook_url"] = webhook_url
             save_config(config)
             return webhook_url
         console.print("[red]Invalid webhook URL. Please enter a valid Discord webhook URL.[/red]")
 
+def write_if_changed(file_path, content):
+    """Write content to file_path unless the file already holds exactly that content"""
+    path = Path(file_path)
+    data = content.encode()
+    # Compare raw bytes so an existing file in another encoding is simply overwritten
+    try:
+        if path.read_bytes() == data:
+            return
+    except OSError:
+        pass
+    path.write_bytes(data)
+
 def show_file_location(file_path):
     """Show the full path of the created file"""
-    full_path = os.path.abspath(file_path)
-    console.print("\n[bold green]Created File Location:[/bold green]")
-    console.print(f"[yellow]{full_path}[/yellow]")
-    console.print("\n[bold blue]You can now share this file to track IP addresses.[/bold blue]")
+    full_path = os.path.join(CWD, file_path)
+    console.print(
+        "\n[bold green]Created File Location:[/bold green]\n"
+        f"[yellow]{full_path}[/yellow]\n"
+        "\n[bold blue]You can now share this file to track IP addresses.[/bold blue]"
+    )
 
 def create_tracking_pdf(original_pdf, webhook_url):
     """Create a PDF that tracks IP when opened"""
@@ -255,8 +389,7 @@ if __name__ == "__main__":
         
         # Create a temporary Python script
         script_path = "temp_tracking.py"
-        with open(script_path, 'w') as f:
-            f.write(tracking_script)
+        write_if_changed(script_path, tracking_script)
         
         # Create a batch file to run the script when PDF is opened
         if sys.platform == "win32":
@@ -266,8 +399,7 @@ timeout /t 1 /nobreak
 python "{script_path}"
 """
             batch_file = f"open_{os.path.basename(output_pdf)}.bat"
-            with open(batch_file, 'w') as f:
-                f.write(batch_content)
+            Path(batch_file).write_text(batch_content)
         else:
             shell_content = f"""#!/bin/bash
 xdg-open "{output_pdf}"
@@ -275,13 +407,11 @@ sleep 1
 python3 "{script_path}"
 """
             shell_file = f"open_{os.path.basename(output_pdf)}.sh"
-            with open(shell_file, 'w') as f:
-                f.write(shell_content)
+            Path(shell_file).write_text(shell_content)
             os.chmod(shell_file, 0o755)  # Make shell script executable
         
         # Copy the original PDF
-        import shutil
-        shutil.copy2(original_pdf, output_pdf)
+        shutil.copyfile(original_pdf, output_pdf)
         
         console.print(f"[green]Successfully created tracking PDF![/green]")
         console.print("\n[bold yellow]Important:[/bold yellow]")
@@ -371,8 +501,7 @@ if __name__ == "__main__":
         
         # Create a temporary Python script
         script_path = "temp_tracking.py"
-        with open(script_path, 'w') as f:
-            f.write(tracking_script)
+        write_if_changed(script_path, tracking_script)
         
         # Create a batch file to run the script when image is opened
         if sys.platform == "win32":
@@ -382,8 +511,7 @@ timeout /t 1 /nobreak
 python "{script_path}"
 """
             batch_file = f"open_{os.path.basename(output_image)}.bat"
-            with open(batch_file, 'w') as f:
-                f.write(batch_content)
+            Path(batch_file).write_text(batch_content)
         else:
             shell_content = f"""#!/bin/bash
 xdg-open "{output_image}"
@@ -391,13 +519,11 @@ sleep 1
 python3 "{script_path}"
 """
             shell_file = f"open_{os.path.basename(output_image)}.sh"
-            with open(shell_file, 'w') as f:
-                f.write(shell_content)
+            Path(shell_file).write_text(shell_content)
             os.chmod(shell_file, 0o755)  # Make shell script executable
         
         # Copy the original image
-        import shutil
-        shutil.copy2(original_image, output_image)
+        shutil.copyfile(original_image, output_image)
         
         console.print(f"[green]Successfully created tracking image![/green]")
         console.print("\n[bold yellow]Important:[/bold yellow]")
@@ -628,23 +754,27 @@ window.addEventListener('load', () => {{
         console.print(f"[red]Error creating tracking website: {str(e)}[/red]")
         return None
 
+# The menu never changes, so its renderables are built once
+MENU_PANEL = Panel.fit(
+    "[bold blue]IP Tracker Tool[/bold blue]\n"
+    "[italic]Educational Purpose Only[/italic]",
+    title="Welcome",
+    border_style="blue"
+)
+MENU_TABLE = Table(show_header=False, box=None)
+MENU_TABLE.add_row("1", "Create Tracking Website")
+MENU_TABLE.add_row("2", "Exit")
+MENU_PROMPT = "\n[bold blue]Enter your choice[/bold blue]"
+MENU_CHOICES = ["1", "2"]
+
 def show_menu():
     console.clear()
-    console.print(Panel.fit(
-        "[bold blue]IP Tracker Tool[/bold blue]\n"
-        "[italic]Educational Purpose Only[/italic]",
-        title="Welcome",
-        border_style="blue"
-    ))
-    
-    table = Table(show_header=False, box=None)
-    table.add_row("1", "Create Tracking Website")
-    table.add_row("2", "Exit")
-    console.print(table)
+    console.print(MENU_PANEL)
+    console.print(MENU_TABLE)
     
     while True:
         try:
-            choice = Prompt.ask("\n[bold blue]Enter your choice[/bold blue]", choices=["1", "2"])
+            choice = Prompt.ask(MENU_PROMPT, choices=MENU_CHOICES)
             return int(choice)
         except ValueError:
             console.print("[red]Please enter a valid number.[/red]")
@@ -652,30 +782,21 @@ def show_menu():
 def install_required_packages():
     """Install required packages globally"""
     try:
-        console.print("[yellow]Checking and installing required packages...[/yellow]")
-        
-        # List of required packages
-        packages = [
-            "requests==2.31.0",
-            "PyPDF2==3.0.1",
-            "beautifulsoup4==4.12.2",
-            "rich==13.7.0"
-        ]
-        
-        # Try installing with pip first
-        for package in packages:
-            try:
-                console.print(f"[yellow]Installing {package}...[/yellow]")
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "--no-cache-dir", package])
-                console.print(f"[green]Successfully installed {package}[/green]")
-            except subprocess.CalledProcessError as e:
-                console.print(f"[red]Error installing {package}: {str(e)}[/red]")
-                return False
+        # A single pip call resolves all packages together
+        try:
+            run_captured(
+                [sys.executable, "-m", "pip", "install", "--no-cache-dir", *REQUIRED_PACKAGES],
+                "Checking and installing required packages..."
+            )
+            console.print("[green]Successfully installed required packages[/green]")
+        except subprocess.CalledProcessError as e:
+            console.print(f"[red]Error installing required packages: {str(e)}[/red]")
+            return False
         
         # Verify installations
         console.print("[yellow]Verifying package installations...[/yellow]")
         try:
-            subprocess.check_call([sys.executable, "-c", "import requests; import PyPDF2; import bs4; import rich"])
+            subprocess.check_call([sys.executable, "-c", IMPORT_PROBE])
             console.print("[green]All packages installed successfully![/green]")
             return True
         except subprocess.CalledProcessError as e:
@@ -693,12 +814,7 @@ def main():
         console.print("[red]Failed to set up the environment. Please check your Python installation and try again.[/red]")
         return
     
-    # Get the current script path
-    script_path = os.path.abspath(__file__)
-    
-    # Run the script in the virtual environment
-    console.print("[green]Starting IP Tracker Tool in virtual environment...[/green]")
-    subprocess.call([python_executable, script_path, "--in-venv"])
+    exec_in_venv(python_executable)
 
 if __name__ == "__main__":
     if "--in-venv" in sys.argv: